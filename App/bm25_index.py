@@ -0,0 +1,336 @@
+import os
+import re
+import json
+import math
+import zlib
+import hashlib
+import logging
+from collections import Counter
+from itertools import chain
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from search_utils import top_k_indices
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# BM25 parameters (Lucene variant)
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Bump whenever tokenization or scoring changes so persisted indexes are rebuilt
+INDEX_VERSION = 3
+
+# Corpus statistics for query-side IDF of Pinecone sparse vectors
+SPARSE_ENCODER_FILE = os.path.join("/tmp", "sparse_encoder.json")
+
+_META_FILE = "meta.json"
+_VOCAB_FILE = "vocab.json"
+_ARRAY_FILES = ("indptr", "doc_ids", "scores")
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset({
+    "the", "a", "an", "of", "and", "or", "to", "in", "on", "for", "is", "with"
+})
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokenize text for BM25 indexing and querying.
+    A single regex pass splits on punctuation as well as whitespace;
+    stopwords and single-character tokens are dropped.
+    """
+    return [
+        token for token in _TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 1 and token not in _STOPWORDS
+    ]
+
+def corpus_fingerprint(texts: Iterable[str]) -> str:
+    """
+    Compute a content hash of the corpus texts.
+    Used to decide whether a persisted index still matches the corpus.
+    """
+    hasher = hashlib.sha256(f"v{INDEX_VERSION}:{BM25_K1}:{BM25_B}".encode("utf-8"))
+    for text in texts:
+        hasher.update(text.encode("utf-8", "ignore"))
+        hasher.update(b"\0")
+    return hasher.hexdigest()
+
+class BM25Index:
+    """
+    BM25 index with every term-document score precomputed at index time.
+
+    Scores are stored term-major in CSC layout: the postings of term id ``t``
+    are ``doc_ids[indptr[t]:indptr[t + 1]]`` with matching ``scores``, so a
+    query only touches the postings of the terms it contains instead of
+    scoring the whole corpus.
+    """
+
+    def __init__(self, vocab: Dict[str, int], indptr: np.ndarray,
+                 doc_ids: np.ndarray, scores: np.ndarray, num_docs: int):
+        self.vocab = vocab
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.scores = scores
+        self.num_docs = num_docs
+
+    @classmethod
+    def build(cls, tokenized_corpus: Iterable[List[str]],
+              k1: float = BM25_K1, b: float = BM25_B) -> "BM25Index":
+        """
+        Build an index from tokenized documents.
+
+        Args:
+            tokenized_corpus: Token lists, one per document (may be a generator)
+            k1: Term frequency saturation parameter
+            b: Document length normalization parameter
+
+        Returns:
+            Index with precomputed term-document scores
+        """
+        vocab: Dict[str, int] = {}
+        term_docs: List[List[int]] = []
+        term_freqs: List[List[int]] = []
+        doc_lengths: List[int] = []
+
+        for doc_id, tokens in enumerate(tokenized_corpus):
+            doc_lengths.append(len(tokens))
+            for term, freq in Counter(tokens).items():
+                term_id = vocab.setdefault(term, len(vocab))
+                if term_id == len(term_docs):
+                    term_docs.append([])
+                    term_freqs.append([])
+                term_docs[term_id].append(doc_id)
+                term_freqs[term_id].append(freq)
+
+        num_docs = len(doc_lengths)
+        doc_freqs = np.array([len(docs) for docs in term_docs], dtype=np.int64)
+        indptr = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(doc_freqs, out=indptr[1:])
+        total_postings = int(indptr[-1])
+
+        doc_ids = np.fromiter(chain.from_iterable(term_docs), dtype=np.int32, count=total_postings)
+        tf = np.fromiter(chain.from_iterable(term_freqs), dtype=np.float32, count=total_postings)
+
+        lengths = np.array(doc_lengths, dtype=np.float32)
+        avgdl = float(lengths.mean()) if num_docs and lengths.any() else 1.0
+        length_norm = k1 * (1 - b + b * lengths / avgdl)
+
+        # Lucene IDF is always positive, unlike the Okapi variant on small corpora
+        idf = np.log1p((num_docs - doc_freqs + 0.5) / (doc_freqs + 0.5)).astype(np.float32)
+        scores = np.repeat(idf, doc_freqs) * tf * (k1 + 1) / (tf + length_norm[doc_ids])
+
+        return cls(vocab, indptr, doc_ids, scores.astype(np.float32), num_docs)
+
+    def search(self, query_tokens: List[str], top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score only documents that contain at least one query term.
+
+        Args:
+            query_tokens: Tokenized query
+            top_k: Maximum number of documents to return
+
+        Returns:
+            Tuple of (document indices, scores), best first
+        """
+        term_ids = [self.vocab[token] for token in query_tokens if token in self.vocab]
+        if not term_ids or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+
+        postings = [slice(self.indptr[t], self.indptr[t + 1]) for t in term_ids]
+        docs = np.concatenate([self.doc_ids[p] for p in postings])
+        values = np.concatenate([self.scores[p] for p in postings])
+
+        # Sum the per-term scores of each matched document
+        candidates, inverse = np.unique(docs, return_inverse=True)
+        totals = np.bincount(inverse, weights=values)
+
+        order = top_k_indices(totals, top_k)
+        return candidates[order].astype(np.int64), totals[order]
+
+    def save(self, directory: str, fingerprint: str) -> bool:
+        """
+        Persist the index as raw .npy arrays so it can be memory-mapped on load.
+        Returns True if successful, False otherwise.
+        """
+        try:
+            os.makedirs(directory, exist_ok=True)
+            meta_path = os.path.join(directory, _META_FILE)
+
+            # Remove metadata first so a partial write is never considered valid
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+
+            for name in _ARRAY_FILES:
+                np.save(os.path.join(directory, f"{name}.npy"), getattr(self, name))
+
+            terms = sorted(self.vocab, key=self.vocab.get)
+            with open(os.path.join(directory, _VOCAB_FILE), "w", encoding="utf-8") as f:
+                json.dump(terms, f)
+
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "version": INDEX_VERSION,
+                    "fingerprint": fingerprint,
+                    "num_docs": self.num_docs
+                }, f)
+
+            logger.debug(f"Saved BM25 index to {directory}")
+            return True
+        except Exception as e:
+            logger.warning(f"Error saving BM25 index: {e}")
+            return False
+
+    @classmethod
+    def load(cls, directory: str, fingerprint: str) -> Optional["BM25Index"]:
+        """
+        Load a persisted index with memory-mapped arrays.
+        Returns None if no index exists or it was built from a different corpus.
+        """
+        meta_path = os.path.join(directory, _META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+
+            if meta.get("version") != INDEX_VERSION or meta.get("fingerprint") != fingerprint:
+                logger.info("Persisted BM25 index is stale, rebuilding")
+                return None
+
+            with open(os.path.join(directory, _VOCAB_FILE), "r", encoding="utf-8") as f:
+                vocab = {term: term_id for term_id, term in enumerate(json.load(f))}
+
+            arrays = {
+                name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                for name in _ARRAY_FILES
+            }
+            return cls(vocab, num_docs=meta["num_docs"], **arrays)
+
+        except Exception as e:
+            logger.warning(f"Error loading BM25 index: {e}")
+            return None
+
+def sparse_index(token: str) -> int:
+    """Stable 32-bit position of a term in Pinecone's sparse vector space."""
+    return zlib.crc32(token.encode("utf-8"))
+
+class SparseEncoder:
+    """
+    BM25 encoder for Pinecone sparse-dense hybrid search.
+
+    Documents carry the BM25 term-frequency component and queries carry the
+    IDF component, so their dot product is the document's BM25 score. Terms
+    are hashed into the 32-bit index space, so the ingest and query processes
+    only need to share corpus statistics, not a vocabulary.
+    """
+
+    def __init__(self, doc_freqs: Optional[Dict[int, int]] = None, num_docs: int = 0,
+                 avgdl: float = 1.0, k1: float = BM25_K1, b: float = BM25_B,
+                 doc_stats: Optional[Dict[str, Tuple[int, List[int]]]] = None):
+        self.doc_freqs = doc_freqs or {}
+        self.num_docs = num_docs
+        self.avgdl = avgdl
+        self.k1 = k1
+        self.b = b
+        self.doc_stats = doc_stats or {}  # Document id -> (length, unique terms), for incremental updates
+
+    @classmethod
+    def fit(cls, tokenized_corpus: Iterable[List[str]]) -> "SparseEncoder":
+        """Collect document frequencies and average length from a corpus."""
+        doc_freqs: Counter = Counter()
+        num_docs = 0
+        total_length = 0
+
+        for tokens in tokenized_corpus:
+            doc_freqs.update({sparse_index(token) for token in tokens})
+            num_docs += 1
+            total_length += len(tokens)
+
+        avgdl = total_length / num_docs if total_length else 1.0
+        return cls(dict(doc_freqs), num_docs, avgdl)
+
+    def update(self, ids: List[str], tokenized_docs: Iterable[List[str]]) -> "SparseEncoder":
+        """
+        Merge documents into the corpus statistics like a Pinecone upsert:
+        ids already present are replaced, all others are kept.
+
+        Returns:
+            New encoder with statistics over the merged corpus
+        """
+        if self.num_docs and not self.doc_stats:
+            logger.warning("Sparse statistics have no per-document entries, refitting on these documents only")
+
+        doc_stats = dict(self.doc_stats)
+        for doc_id, tokens in zip(ids, tokenized_docs):
+            doc_stats[doc_id] = (len(tokens), list({sparse_index(token) for token in tokens}))
+
+        doc_freqs = Counter(chain.from_iterable(terms for _, terms in doc_stats.values()))
+        total_length = sum(length for length, _ in doc_stats.values())
+        avgdl = total_length / len(doc_stats) if total_length else 1.0
+        return SparseEncoder(dict(doc_freqs), len(doc_stats), avgdl, self.k1, self.b, doc_stats)
+
+    def encode_document(self, tokens: List[str]) -> Dict[str, list]:
+        """Encode document tokens as BM25 term-frequency weights."""
+        counts = Counter(sparse_index(token) for token in tokens)
+        length_norm = self.k1 * (1 - self.b + self.b * len(tokens) / self.avgdl)
+        return {
+            "indices": list(counts),
+            "values": [tf * (self.k1 + 1) / (tf + length_norm) for tf in counts.values()]
+        }
+
+    def encode_query(self, tokens: List[str]) -> Dict[str, list]:
+        """
+        Encode query tokens as IDF weights normalized to sum to 1.
+        Without fitted statistics every term gets the same weight.
+        """
+        counts = Counter(sparse_index(token) for token in tokens)
+        weights = []
+        for term, tf in counts.items():
+            if self.num_docs:
+                doc_freq = self.doc_freqs.get(term, 0)
+                idf = math.log1p((self.num_docs - doc_freq + 0.5) / (doc_freq + 0.5))
+            else:
+                idf = 1.0
+            weights.append(tf * idf)
+
+        total = sum(weights) or 1.0
+        return {"indices": list(counts), "values": [w / total for w in weights]}
+
+    def save(self, path: str = SPARSE_ENCODER_FILE) -> bool:
+        """
+        Save corpus statistics for the query side.
+        Returns True if successful, False otherwise.
+        """
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "num_docs": self.num_docs,
+                    "avgdl": self.avgdl,
+                    "doc_freqs": {str(term): df for term, df in self.doc_freqs.items()},
+                    "documents": self.doc_stats
+                }, f)
+            return True
+        except Exception as e:
+            logger.warning(f"Error saving sparse encoder: {e}")
+            return False
+
+    @classmethod
+    def load(cls, path: str = SPARSE_ENCODER_FILE) -> "SparseEncoder":
+        """Load saved statistics, or an unfitted encoder if none are available."""
+        try:
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                doc_freqs = {int(term): df for term, df in data["doc_freqs"].items()}
+                return cls(doc_freqs, data["num_docs"], data["avgdl"],
+                           doc_stats=data.get("documents"))
+        except Exception as e:
+            logger.warning(f"Error loading sparse encoder: {e}")
+
+        logger.info("No sparse encoder statistics found, using uniform query weights")
+        return cls()
@@ -0,0 +1,134 @@
+import os
+import sqlite3
+import hashlib
+import functools
+import threading
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Use /tmp for file storage on Render (ephemeral storage)
+EMBED_CACHE_FILE = os.path.join("/tmp", "embedding_cache.sqlite3")
+
+# Configuration
+EMBED_BATCH_SIZE = 64  # Texts per model call for cache misses
+QUERY_EMBED_CACHE_SIZE = 2048  # ~3MB of 384-dim query vectors
+_SQLITE_MAX_VARS = 500  # Stay well below SQLite's bound-parameter limit
+
+def text_key(text: str) -> bytes:
+    """Cache key for a text: its SHA-256 digest."""
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+class EmbeddingStore:
+    """
+    SQLite table of float32 embeddings keyed by content hash.
+    Each embedding model gets its own table, so changing models never
+    returns vectors from the old one.
+    """
+
+    def __init__(self, model_name: str, path: str = EMBED_CACHE_FILE):
+        self.table = "emb_" + hashlib.sha1(model_name.encode("utf-8")).hexdigest()[:16]
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(sha256 BLOB PRIMARY KEY, vec BLOB NOT NULL)"
+            )
+
+    def get_many(self, keys: Iterable[bytes]) -> Dict[bytes, List[float]]:
+        """Return cached embeddings for the keys that are present."""
+        keys = list(keys)
+        found = {}
+
+        with self._lock:
+            for start in range(0, len(keys), _SQLITE_MAX_VARS):
+                chunk = keys[start:start + _SQLITE_MAX_VARS]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT sha256, vec FROM {self.table} WHERE sha256 IN ({placeholders})",
+                    chunk
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+
+        return found
+
+    def put_many(self, items: List[Tuple[bytes, List[float]]]) -> None:
+        """Store embeddings, replacing existing entries."""
+        rows = [(key, np.asarray(vec, dtype=np.float32).tobytes()) for key, vec in items]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (sha256, vec) VALUES (?, ?)",
+                rows
+            )
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that avoids recomputing vectors for known texts.
+
+    Query embeddings are memoized in memory by raw query string. Document
+    embeddings are cached on disk by content hash, and only cache misses are
+    sent to the model, in batches.
+    """
+
+    def __init__(self, embeddings: Embeddings, model_name: str,
+                 cache_path: str = EMBED_CACHE_FILE,
+                 batch_size: int = EMBED_BATCH_SIZE,
+                 query_cache_size: int = QUERY_EMBED_CACHE_SIZE):
+        self.embeddings = embeddings
+        self.batch_size = batch_size
+        self._cached_query = functools.lru_cache(maxsize=query_cache_size)(self._compute_query)
+
+        self.store: Optional[EmbeddingStore] = None
+        try:
+            self.store = EmbeddingStore(model_name, cache_path)
+        except Exception as e:
+            logger.warning(f"Embedding cache disabled: {e}")
+
+    def _compute_query(self, text: str) -> tuple:
+        # Cache immutable tuples so callers can't corrupt cached vectors
+        return tuple(self.embeddings.embed_query(text))
+
+    def embed_query(self, text: str) -> List[float]:
+        return list(self._cached_query(text))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.store is None:
+            return self.embeddings.embed_documents(texts)
+
+        keys = [text_key(text) for text in texts]
+        try:
+            vectors = self.store.get_many(set(keys))
+        except Exception as e:
+            logger.warning(f"Error reading embedding cache: {e}")
+            vectors = {}
+
+        # Embed each distinct uncached text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors:
+                missing.setdefault(key, text)
+        missing_items = list(missing.items())
+
+        for start in range(0, len(missing_items), self.batch_size):
+            batch = missing_items[start:start + self.batch_size]
+            batch_vectors = self.embeddings.embed_documents([text for _, text in batch])
+            new_items = [(key, vec) for (key, _), vec in zip(batch, batch_vectors)]
+            vectors.update(new_items)
+
+            try:
+                self.store.put_many(new_items)
+            except Exception as e:
+                logger.warning(f"Error writing embedding cache: {e}")
+
+        logger.debug(f"Embedded {len(missing_items)} of {len(texts)} texts ({len(texts) - len(missing_items)} cached)")
+        return [vectors[key] for key in keys]
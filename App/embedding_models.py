@@ -0,0 +1,172 @@
+import os
+import logging
+from typing import List
+
+import numpy as np
+from langchain.schema.embeddings import Embeddings
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from embed_cache import CachedEmbeddings, EMBED_BATCH_SIZE
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Configuration
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "onnx")  # "onnx" or "torch"
+# Written by export_onnx.py at build time; kept next to the app so it survives restarts
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "onnx_models"))
+ONNX_QUANTIZED_FILE = "model_quantized.onnx"
+MAX_SEQ_LENGTH = 256  # Matches sentence-transformers' all-MiniLM-L6-v2 truncation
+
+def _l2_normalize(embeddings: np.ndarray) -> np.ndarray:
+    """L2-normalize rows in FP32; FP16 squared norms can underflow."""
+    embeddings = embeddings.astype(np.float32, copy=False)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.clip(norms, 1e-12, None)
+
+def _cuda_available() -> bool:
+    """True if PyTorch is installed and can see a CUDA device."""
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except ImportError:
+        return False
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings from an INT8-quantized ONNX export of a transformer.
+    Mean-pools token embeddings and L2-normalizes them, matching
+    sentence-transformers with normalize_embeddings=True.
+    """
+
+    def __init__(self, model_dir: str, batch_size: int = EMBED_BATCH_SIZE,
+                 max_length: int = MAX_SEQ_LENGTH):
+        from optimum.onnxruntime import ORTModelForFeatureExtraction
+        from transformers import AutoTokenizer
+
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            model_dir, file_name=ONNX_QUANTIZED_FILE
+        )
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        inputs = self.tokenizer(
+            texts, padding=True, truncation=True,
+            max_length=self.max_length, return_tensors="np"
+        )
+        token_embeddings = self.model(**inputs).last_hidden_state
+
+        # Mean pooling over non-padding tokens
+        mask = inputs["attention_mask"][..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        return _l2_normalize(summed / np.clip(mask.sum(axis=1), 1e-9, None))
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.extend(self._embed(texts[start:start + self.batch_size]).tolist())
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+class Fp16Embeddings(Embeddings):
+    """
+    Sentence embeddings from a SentenceTransformer cast to FP16 on a CUDA
+    device, so the transformer MatMuls run on tensor cores. Pooled vectors
+    are normalized in FP32.
+    """
+
+    def __init__(self, model_name: str, batch_size: int = EMBED_BATCH_SIZE,
+                 device: str = "cuda"):
+        from sentence_transformers import SentenceTransformer
+
+        self.batch_size = batch_size
+        self.model = SentenceTransformer(model_name, device=device)
+        self.model.half()
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        # encode() already runs under torch.no_grad()
+        embeddings = self.model.encode(
+            texts, batch_size=self.batch_size, convert_to_numpy=True,
+            normalize_embeddings=False, show_progress_bar=False
+        )
+        return _l2_normalize(embeddings)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+def onnx_model_dir(model_name: str) -> str:
+    """Directory holding the INT8 ONNX export of model_name."""
+    return os.path.join(ONNX_MODEL_DIR, model_name.replace("/", "__"))
+
+def export_quantized_onnx(model_name: str, output_dir: str) -> str:
+    """
+    Export a HuggingFace model to ONNX and quantize it to INT8 (dynamic,
+    AVX-512 VNNI kernels). Skipped if the quantized model already exists.
+    Run once at build time (export_onnx.py), never on the serving path.
+
+    Returns:
+        Directory containing the quantized model and tokenizer
+    """
+    if os.path.exists(os.path.join(output_dir, ONNX_QUANTIZED_FILE)):
+        return output_dir
+
+    from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    from transformers import AutoTokenizer
+
+    logger.info(f"Exporting {model_name} to INT8 ONNX in {output_dir}")
+    model = ORTModelForFeatureExtraction.from_pretrained(model_name, export=True)
+
+    quantizer = ORTQuantizer.from_pretrained(model)
+    quantization_config = AutoQuantizationConfig.avx512_vnni(is_static=False, per_channel=False)
+    quantizer.quantize(save_dir=output_dir, quantization_config=quantization_config)
+
+    model.config.save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(model_name).save_pretrained(output_dir)
+    return output_dir
+
+def load_embeddings(model_name: str) -> CachedEmbeddings:
+    """
+    Load embeddings for model_name with the fastest available backend.
+
+    Uses FP16 PyTorch when a CUDA device is available, then the INT8 ONNX
+    model when EMBEDDING_BACKEND is "onnx" and export_onnx.py has written it,
+    otherwise FP32 PyTorch on CPU. Nothing is exported here, so startup
+    never pays for a model export. The result is wrapped in
+    CachedEmbeddings, namespaced by backend since reduced-precision vectors
+    differ slightly from FP32 ones.
+    """
+    if _cuda_available():
+        try:
+            embeddings = Fp16Embeddings(model_name)
+            logger.info(f"Loaded FP16 CUDA embeddings for {model_name}")
+            return CachedEmbeddings(embeddings, model_name=f"{model_name}@cuda-fp16")
+        except Exception as e:
+            logger.warning(f"FP16 CUDA embeddings unavailable: {e}")
+
+    model_dir = onnx_model_dir(model_name)
+    if EMBEDDING_BACKEND == "onnx" and not os.path.exists(os.path.join(model_dir, ONNX_QUANTIZED_FILE)):
+        logger.info(f"No INT8 ONNX model in {model_dir} (run export_onnx.py at build time), using PyTorch embeddings")
+    elif EMBEDDING_BACKEND == "onnx":
+        try:
+            embeddings = OnnxEmbeddings(model_dir)
+            logger.info(f"Loaded INT8 ONNX embeddings for {model_name}")
+            return CachedEmbeddings(embeddings, model_name=f"{model_name}@onnx-int8")
+        except ImportError:
+            logger.info("optimum[onnxruntime] not installed, using PyTorch embeddings")
+        except Exception as e:
+            logger.warning(f"ONNX embeddings unavailable, using PyTorch: {e}")
+
+    embeddings = HuggingFaceEmbeddings(
+        model_name=model_name,
+        model_kwargs={'device': 'cpu'},  # Ensure CPU usage for Render
+        encode_kwargs={'normalize_embeddings': True, 'batch_size': EMBED_BATCH_SIZE}
+    )
+    return CachedEmbeddings(embeddings, model_name=model_name)
@@ -0,0 +1,30 @@
+import logging
+from dotenv import load_dotenv
+
+# Load environment variables before local modules read their settings
+load_dotenv()
+
+from embedding_models import export_quantized_onnx, onnx_model_dir
+from hybrid_retriever import HF_MODEL
+from upsert_utils import EMBEDDING_MODEL
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def main():
+    """Export the serving and ingest embedding models to INT8 ONNX (run in the build step)."""
+    try:
+        for model_name in dict.fromkeys((HF_MODEL, EMBEDDING_MODEL)):
+            model_dir = export_quantized_onnx(model_name, onnx_model_dir(model_name))
+            logger.info(f"✅ INT8 ONNX model for {model_name} ready in {model_dir}")
+        
+        return True
+        
+    except Exception as e:
+        logger.error(f"❌ ONNX export failed, embeddings will fall back to PyTorch: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    exit(0 if success else 1)
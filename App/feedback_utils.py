@@ -1,8 +1,14 @@
-import json
 import os
+import atexit
+import heapq
+import queue
+import threading
+import time
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Iterator, Optional, Tuple
 import logging
+import numpy as np
+import orjson
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -10,37 +16,157 @@ logger = logging.getLogger(__name__)
 
 # Use /tmp for file storage on Render (ephemeral storage)
 SCORES_FILE = os.path.join("/tmp", "feedback_scores.json")
+SCORE_DELTAS_FILE = os.path.join("/tmp", "feedback_scores.jsonl")  # Appended since last snapshot
 FEEDBACK_LOG_FILE = os.path.join("/tmp", "feedback_log.jsonl")
 
+# Configuration
+COMPACT_EVERY = 1000  # Delta lines appended before they are folded into the snapshot
+FEEDBACK_LOG_BUFFER_SIZE = 1 << 16  # Bytes of feedback log entries buffered per write
+FEEDBACK_FLUSH_INTERVAL = 0.1  # Seconds the background writer waits to fill a batch
+FEEDBACK_FLUSH_BATCH = 64  # Entries written per batch at most
+SCORES_WRITE_BUFFER_SIZE = 1 << 20  # Snapshot is written in few large syscalls
+
+_COMPACTING_SUFFIX = ".compacting"  # Delta log set aside while it is folded into the snapshot
+_ID_KEYS = ("doi", "url", "id", "title")  # Source fields identifying a document, in priority order
+
+_scores_lock = threading.Lock()
+_deltas_since_compaction = 0
+_scores_cache = (None, {})  # (scores_signature() when loaded, scores)
+_feedback_log_lock = threading.Lock()
+_feedback_log_writer = None  # Append handle kept open across log_feedback calls
+_feedback_queue: "queue.Queue[bytes]" = queue.Queue()
+_feedback_thread = None  # Background writer, started on first log_feedback
+
+def scores_signature() -> Tuple[Tuple[int, int], ...]:
+    """
+    Cheap change token for the feedback scores: (mtime_ns, size) of the
+    snapshot and the delta log. Changes whenever load_scores() would.
+    """
+    signature = []
+    for path in (SCORES_FILE, SCORE_DELTAS_FILE):
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append((0, 0))
+    return tuple(signature)
+
 def load_scores() -> Dict[str, float]:
     """
-    Load feedback scores from file.
-    Returns empty dict if file doesn't exist.
+    Load feedback scores, parsing the files only when they have changed.
+    The returned dict is shared between callers and must not be modified.
     """
+    global _scores_cache
+    
+    signature = scores_signature()
+    cached_signature, cached_scores = _scores_cache
+    if signature == cached_signature:
+        return cached_scores
+    
     try:
-        if os.path.exists(SCORES_FILE):
-            with open(SCORES_FILE, "r", encoding="utf-8") as f:
-                scores = json.load(f)
-                logger.debug(f"Loaded {len(scores)} feedback scores")
-                return scores
-        else:
-            logger.debug("No existing scores file found, starting fresh")
-            return {}
+        scores = _read_scores()
     except Exception as e:
         logger.error(f"Error loading scores: {e}")
-        return {}
+        return cached_scores  # Last scores read successfully
+    
+    _scores_cache = (signature, scores)
+    return scores
+
+def _compacting_segments() -> List[str]:
+    """Delta log segments set aside by compactions, oldest first."""
+    directory, prefix = os.path.split(SCORE_DELTAS_FILE)
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return []
+    return sorted(
+        os.path.join(directory, name) for name in names
+        if name.startswith(prefix + ".") and name.endswith(_COMPACTING_SUFFIX)
+    )
+
+def _replay_deltas(path: str, scores: Dict[str, float]) -> None:
+    """Apply every delta line in a log file to scores."""
+    with open(path, "rb") as f:
+        for line in f:
+            try:
+                entry = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                continue  # Torn write from an interrupted append
+            scores[entry["id"]] = scores.get(entry["id"], 0) + entry["delta"]
+
+def _read_scores() -> Dict[str, float]:
+    """
+    Read feedback scores: the snapshot file with the delta logs replayed on top.
+    Segments the snapshot already folded in are skipped. Raises on I/O errors.
+    """
+    scores, folded = {}, set()
+    if os.path.exists(SCORES_FILE):
+        with open(SCORES_FILE, "rb") as f:
+            snapshot = orjson.loads(f.read())
+        if isinstance(snapshot.get("scores"), dict):
+            scores, folded = snapshot["scores"], set(snapshot.get("folded_segments", ()))
+        else:
+            scores = snapshot  # Plain score map written before delta logs existed
+    else:
+        logger.debug("No existing scores file found, starting fresh")
+    
+    for path in _compacting_segments():
+        if os.path.basename(path) not in folded:
+            _replay_deltas(path, scores)
+    
+    if os.path.exists(SCORE_DELTAS_FILE):
+        _replay_deltas(SCORE_DELTAS_FILE, scores)
+    
+    logger.debug(f"Loaded {len(scores)} feedback scores")
+    return scores
+
+def _replace_snapshot(scores: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """
+    Fold the delta log into a new snapshot. Call with _scores_lock held.
+    
+    The live log is first renamed to a unique segment and the snapshot
+    records which segments it contains, so a crash at any step neither
+    loses nor double-counts deltas.
+    
+    Args:
+        scores: Scores to save, replacing all deltas; None folds the logged deltas in
+        
+    Returns:
+        Scores now stored in the snapshot
+    """
+    # Ensure directory exists
+    os.makedirs(os.path.dirname(SCORES_FILE), exist_ok=True)
+    
+    if os.path.exists(SCORE_DELTAS_FILE) and os.path.getsize(SCORE_DELTAS_FILE):
+        os.replace(SCORE_DELTAS_FILE, f"{SCORE_DELTAS_FILE}.{time.time_ns():020d}{_COMPACTING_SUFFIX}")
+    
+    segments = _compacting_segments()
+    if scores is None:
+        scores = _read_scores()
+    
+    # Write a temp file and rename it over the snapshot, so a crash
+    # mid-write never leaves a truncated scores file
+    snapshot = {"scores": scores, "folded_segments": [os.path.basename(p) for p in segments]}
+    tmp_path = SCORES_FILE + ".tmp"
+    with open(tmp_path, "wb", buffering=SCORES_WRITE_BUFFER_SIZE) as f:
+        f.write(orjson.dumps(snapshot, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, SCORES_FILE)
+    
+    # Safe to crash before this: the snapshot marks these segments as folded
+    for path in segments:
+        os.remove(path)
+    
+    _cache_scores(scores)
+    return scores
 
 def save_scores(scores: Dict[str, float]) -> bool:
     """
-    Save feedback scores to file.
+    Save feedback scores as the new snapshot, replacing any logged deltas.
     Returns True if successful, False otherwise.
     """
     try:
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(SCORES_FILE), exist_ok=True)
-        
-        with open(SCORES_FILE, "w", encoding="utf-8") as f:
-            json.dump(scores, f, indent=2)
+        with _scores_lock:
+            _replace_snapshot(dict(scores))
         
         logger.debug(f"Saved {len(scores)} feedback scores")
         return True
@@ -48,6 +174,72 @@ def save_scores(scores: Dict[str, float]) -> bool:
         logger.error(f"Error saving scores: {e}")
         return False
 
+def _cache_scores(scores: Dict[str, float]) -> None:
+    """Cache scores just written, so the next load_scores() skips the parse."""
+    global _scores_cache
+    _scores_cache = (scores_signature(), scores)
+
+def compact_scores() -> bool:
+    """
+    Fold the delta log into the snapshot file.
+    Returns True if successful, False otherwise.
+    """
+    global _deltas_since_compaction
+    
+    try:
+        with _scores_lock:
+            _replace_snapshot()
+            _deltas_since_compaction = 0
+        
+        logger.info("Compacted feedback score deltas into snapshot")
+        return True
+    except Exception as e:
+        logger.error(f"Error compacting scores: {e}")
+        return False
+
+def _append_score_deltas(updates: Dict[str, int]) -> None:
+    """Append one delta line per changed document, compacting every COMPACT_EVERY lines."""
+    global _deltas_since_compaction
+    
+    lines = b"".join(
+        orjson.dumps({"id": doc_id, "delta": delta}) + b"\n"
+        for doc_id, delta in updates.items()
+    )
+    with _scores_lock:
+        cached_signature, cached_scores = _scores_cache
+        was_current = cached_signature == scores_signature()
+        
+        os.makedirs(os.path.dirname(SCORE_DELTAS_FILE), exist_ok=True)
+        with open(SCORE_DELTAS_FILE, "a+b") as f:
+            # Terminate a torn last line so it can't swallow this append
+            size = f.seek(0, os.SEEK_END)
+            if size:
+                f.seek(size - 1)
+                if f.read(1) != b"\n":
+                    lines = b"\n" + lines
+            f.write(lines)
+        
+        if was_current:
+            # Apply the deltas to a copy; readers may still hold the old dict
+            scores = dict(cached_scores)
+            for doc_id, delta in updates.items():
+                scores[doc_id] = scores.get(doc_id, 0) + delta
+            _cache_scores(scores)
+        
+        _deltas_since_compaction += len(updates)
+        should_compact = _deltas_since_compaction >= COMPACT_EVERY
+    
+    if should_compact:
+        compact_scores()
+
+def _source_id(source: Dict[str, Any]) -> str:
+    """Identify a source by its first non-empty ID field, else its first 100 characters."""
+    for key in _ID_KEYS:
+        value = source.get(key)
+        if value:
+            return value
+    return source.get("content", "")[:100]  # Sliced only when no ID field is set
+
 def update_scores(sources: List[Dict[str, Any]], approved: bool) -> Dict[str, float]:
     """
     Update scores for sources based on user feedback.
@@ -60,47 +252,39 @@ def update_scores(sources: List[Dict[str, Any]], approved: bool) -> Dict[str, fl
         Updated scores dictionary
     """
     try:
-        scores = load_scores()
+        updates: Dict[str, int] = {}
         delta = 1 if approved else -1
-        updated_count = 0
         
         for source in sources:
-            # Try multiple ways to identify the document
-            doc_id = (
-                source.get("doi") or 
-                source.get("url") or 
-                source.get("id") or 
-                source.get("title") or
-                source.get("content", "")[:100]  # First 100 chars as fallback
-            )
+            doc_id = _source_id(source)
             
             if not doc_id or doc_id == "N/A":
                 continue
                 
             # Update score
-            old_score = scores.get(doc_id, 0)
-            scores[doc_id] = old_score + delta
-            updated_count += 1
-            
-            logger.debug(f"Updated score for {doc_id[:50]}...: {old_score} -> {scores[doc_id]}")
+            updates[doc_id] = updates.get(doc_id, 0) + delta
+            logger.debug(f"Score change for {doc_id[:50]}...: {delta:+d}")
         
-        # Save updated scores
-        if updated_count > 0:
-            save_scores(scores)
-            logger.info(f"Updated scores for {updated_count} sources (approved: {approved})")
+        # Append deltas instead of rewriting every score
+        if updates:
+            _append_score_deltas(updates)
+            logger.info(f"Updated scores for {len(updates)} sources (approved: {approved})")
         else:
             logger.warning("No valid document IDs found in sources")
-            
-        return scores
+        
+        # Copy, since load_scores() shares its dict; a cache refresh is cheap after the append
+        return dict(load_scores())
         
     except Exception as e:
         logger.error(f"Error updating scores: {e}")
-        return load_scores()  # Return existing scores if update fails
+        return dict(load_scores())  # Return existing scores if update fails
 
 def log_feedback(question: str, answer: str, sources: List[Dict[str, Any]], 
                 approved: bool, user_comment: Optional[str] = None) -> bool:
     """
     Log detailed feedback to a file for analysis.
+    The entry is queued and written by a background thread, so the request
+    never waits on disk I/O.
     
     Args:
         question: Original user question
@@ -110,12 +294,9 @@ def log_feedback(question: str, answer: str, sources: List[Dict[str, Any]],
         user_comment: Optional user comment
         
     Returns:
-        True if logging successful, False otherwise
+        True if the entry was queued, False otherwise
     """
     try:
-        # Ensure directory exists
-        os.makedirs(os.path.dirname(FEEDBACK_LOG_FILE), exist_ok=True)
-        
         feedback_entry = {
             "timestamp": datetime.utcnow().isoformat(),
             "question": question,
@@ -135,16 +316,90 @@ def log_feedback(question: str, answer: str, sources: List[Dict[str, Any]],
             ]
         }
         
-        with open(FEEDBACK_LOG_FILE, "a", encoding="utf-8") as f:
-            f.write(json.dumps(feedback_entry) + "\n")
+        _start_feedback_writer()
+        _feedback_queue.put(orjson.dumps(feedback_entry) + b"\n")
             
-        logger.info(f"Logged feedback entry (approved: {approved})")
+        logger.info(f"Queued feedback entry (approved: {approved})")
         return True
         
     except Exception as e:
         logger.error(f"Error logging feedback: {e}")
         return False
 
+def _open_feedback_log():
+    """Return the buffered feedback log writer, opening it on first use. Call with the lock held."""
+    global _feedback_log_writer
+    
+    if _feedback_log_writer is None or _feedback_log_writer.closed:
+        # Ensure directory exists
+        os.makedirs(os.path.dirname(FEEDBACK_LOG_FILE), exist_ok=True)
+        _feedback_log_writer = open(FEEDBACK_LOG_FILE, "ab", buffering=FEEDBACK_LOG_BUFFER_SIZE)
+    return _feedback_log_writer
+
+def _start_feedback_writer() -> None:
+    """Start the background feedback log writer if it is not running."""
+    global _feedback_thread
+    
+    with _feedback_log_lock:
+        if _feedback_thread is None or not _feedback_thread.is_alive():
+            _feedback_thread = threading.Thread(
+                target=_drain_feedback_queue, name="feedback-log", daemon=True
+            )
+            _feedback_thread.start()
+
+def _drain_feedback_queue() -> None:
+    """Write queued entries in batches of up to FEEDBACK_FLUSH_BATCH every FEEDBACK_FLUSH_INTERVAL."""
+    while True:
+        batch = [_feedback_queue.get()]
+        deadline = time.monotonic() + FEEDBACK_FLUSH_INTERVAL
+        
+        while len(batch) < FEEDBACK_FLUSH_BATCH:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_feedback_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        try:
+            with _feedback_log_lock:
+                writer = _open_feedback_log()
+                writer.write(b"".join(batch))
+                writer.flush()
+        except Exception as e:
+            logger.error(f"Error writing {len(batch)} feedback entries: {e}")
+        finally:
+            for _ in batch:
+                _feedback_queue.task_done()
+
+def flush_feedback_log() -> None:
+    """Wait for queued feedback entries and write them to disk."""
+    if _feedback_thread is not None and _feedback_thread.is_alive():
+        _feedback_queue.join()
+    
+    with _feedback_log_lock:
+        if _feedback_log_writer is not None and not _feedback_log_writer.closed:
+            _feedback_log_writer.flush()
+
+atexit.register(flush_feedback_log)
+
+def iter_feedback_log() -> Iterator[Dict[str, Any]]:
+    """
+    Stream logged feedback entries one at a time, oldest first.
+    Memory use does not grow with the size of the log.
+    """
+    flush_feedback_log()
+    if not os.path.exists(FEEDBACK_LOG_FILE):
+        return
+    
+    with open(FEEDBACK_LOG_FILE, "rb") as f:
+        for line_num, line in enumerate(f, 1):
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError as e:
+                logger.warning(f"Skipping invalid feedback log line {line_num}: {e}")
+
 def get_score_stats() -> Dict[str, Any]:
     """
     Get statistics about feedback scores.
@@ -164,16 +419,17 @@ def get_score_stats() -> Dict[str, Any]:
                 "neutral_scores": 0
             }
         
-        values = list(scores.values())
-        positive_scores = len([s for s in values if s > 0])
-        negative_scores = len([s for s in values if s < 0])
-        neutral_scores = len([s for s in values if s == 0])
+        # One contiguous array instead of repeated passes over boxed values
+        values = np.array(list(scores.values()))
+        negative_scores, neutral_scores, positive_scores = (
+            np.bincount((np.sign(values) + 1).astype(np.intp), minlength=3).tolist()
+        )
         
         return {
             "total_documents": len(scores),
-            "average_score": sum(values) / len(values),
-            "max_score": max(values),
-            "min_score": min(values),
+            "average_score": float(values.mean()),
+            "max_score": values.max().item(),  # .item() keeps ints as ints
+            "min_score": values.min().item(),
             "positive_scores": positive_scores,
             "negative_scores": negative_scores,
             "neutral_scores": neutral_scores
@@ -196,12 +452,12 @@ def get_top_sources(limit: int = 10) -> List[Dict[str, Any]]:
     try:
         scores = load_scores()
         
-        # Sort by score (highest first)
-        sorted_sources = sorted(scores.items(), key=lambda x: x[1], reverse=True)
+        # Select the highest scores without sorting the rest (highest first)
+        top_sources = heapq.nlargest(limit, scores.items(), key=lambda x: x[1])
         
         return [
             {"document_id": doc_id, "score": score}
-            for doc_id, score in sorted_sources[:limit]
+            for doc_id, score in top_sources
         ]
         
     except Exception as e:
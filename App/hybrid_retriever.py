@@ -1,13 +1,19 @@
 import os
-import json
-from typing import List, Optional, Dict, Any
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Tuple, Iterator
 import logging
+import numpy as np
+import orjson
+import xxhash
 from langchain.schema import Document
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Pinecone
 import pinecone
-from rank_bm25 import BM25Okapi
+from bm25_index import BM25Index, SparseEncoder, tokenize, corpus_fingerprint
+from embedding_models import load_embeddings
+from vector_quantization import QuantizedVectorStore
 from feedback_utils import load_scores
+from search_utils import HYBRID_SEARCH, TEXT_KEY
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -16,61 +22,143 @@ logger = logging.getLogger(__name__)
 # File paths - use /tmp for Render deployment
 CORPUS_FILE = os.path.join("/tmp", "corpus.jsonl")
 BACKUP_CORPUS_FILE = "corpus.jsonl"  # Fallback if /tmp file doesn't exist
+BM25_INDEX_DIR = os.path.join("/tmp", "bm25_index")  # Persisted BM25 index
 
 # Configuration
 DEFAULT_HF_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
 HF_MODEL = os.environ.get("HF_EMBEDDING_MODEL", DEFAULT_HF_MODEL)
 SEMANTIC_WEIGHT = 0.7  # Weight for semantic search vs BM25
 BM25_WEIGHT = 0.3
+FEEDBACK_WEIGHT = 0.1  # Boost per net feedback vote
+RESPONSE_CACHE_SIZE = 256  # Max cached query results
+RESPONSE_CACHE_TTL = 300  # Seconds before a cached result expires
+RESPONSE_CACHE_THRESHOLD = 0.95  # Cosine similarity needed for a cache hit
+RETRIEVAL_WORKERS = 8  # Threads scoring BM25 while request threads wait on Pinecone
+SEMANTIC_CANDIDATES = 8  # Max candidates fetched from Pinecone per query
+SEMANTIC_RETRY_INITIAL = 5  # Seconds before the first reconnect attempt
+SEMANTIC_RETRY_MAX = 300  # Cap for exponential reconnect backoff
+SEMANTIC_RETRY_AFTER_ERROR = 60  # Seconds to wait after a failed query
+CORPUS_METADATA_FIELDS = ("id", "doi", "url", "title", "category", "species")
 
-def load_corpus_texts() -> tuple[List[str], List[Dict[str, Any]]]:
-    """Load corpus texts from file with fallback options."""
-    texts = []
-    docs = []
-    
+def iter_corpus() -> Iterator[Dict[str, Any]]:
+    """
+    Stream corpus records from file with fallback options.
+    Yields slim records holding the text plus the metadata fields used downstream.
+    """
     # Try loading from /tmp first, then fallback to local file
     corpus_paths = [CORPUS_FILE, BACKUP_CORPUS_FILE]
     
     for corpus_path in corpus_paths:
         if os.path.exists(corpus_path):
             try:
-                with open(corpus_path, "r", encoding="utf-8") as f:
+                count = 0
+                
+                # Binary mode lets orjson parse UTF-8 bytes directly
+                with open(corpus_path, "rb") as f:
                     for line_num, line in enumerate(f, 1):
                         try:
-                            rec = json.loads(line.strip())
-                            
-                            # Extract text with multiple fallback options
-                            txt = (
-                                rec.get("text") or 
-                                rec.get("title") or 
-                                rec.get("abstract") or 
-                                rec.get("content") or
-                                ""
-                            )
-                            
-                            if txt.strip():  # Only add non-empty texts
-                                texts.append(txt.strip())
-                                
-                                # Ensure document has required metadata
-                                if "id" not in rec and "doi" not in rec and "url" not in rec:
-                                    rec["id"] = f"doc_{line_num}"
-                                
-                                docs.append(rec)
-                                
-                        except json.JSONDecodeError as e:
+                            rec = orjson.loads(line)
+                        except orjson.JSONDecodeError as e:
                             logger.warning(f"Skipping invalid JSON on line {line_num}: {e}")
                             continue
+                        
+                        # Extract text with multiple fallback options
+                        txt = (
+                            rec.get("text") or 
+                            rec.get("title") or 
+                            rec.get("abstract") or 
+                            rec.get("content") or
+                            ""
+                        ).strip()
+                        
+                        if not txt:  # Only add non-empty texts
+                            continue
+                        
+                        # Keep only the fields needed for ranking and source display
+                        doc = {"text": txt}
+                        for field in CORPUS_METADATA_FIELDS:
+                            if rec.get(field):
+                                doc[field] = rec[field]
+                        
+                        # Ensure document has required metadata
+                        if "id" not in doc and "doi" not in doc and "url" not in doc:
+                            doc["id"] = f"doc_{line_num}"
+                        
+                        count += 1
+                        yield doc
                             
-                logger.info(f"Loaded {len(texts)} documents from {corpus_path}")
-                break
+                logger.info(f"Loaded {count} documents from {corpus_path}")
+                return
                 
             except Exception as e:
                 logger.error(f"Error reading corpus file {corpus_path}: {e}")
                 continue
-    else:
-        logger.warning("No corpus file found - BM25 retrieval will be disabled")
     
-    return texts, docs
+    logger.warning("No corpus file found - BM25 retrieval will be disabled")
+
+class SemanticResponseCache:
+    """
+    Cache of recent retrieval results keyed by query embedding.
+    A query whose embedding is close enough to a cached, unexpired query
+    reuses that query's documents instead of running retrieval again.
+    """
+    
+    def __init__(self, maxsize: int = RESPONSE_CACHE_SIZE,
+                 ttl: float = RESPONSE_CACHE_TTL,
+                 threshold: float = RESPONSE_CACHE_THRESHOLD):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.clear()
+    
+    def clear(self) -> None:
+        """Drop all cached results."""
+        with self._lock:
+            self._vectors: Optional[np.ndarray] = None  # (maxsize, dim), allocated on first put
+            self._created = np.zeros(self.maxsize)
+            self._last_used = np.zeros(self.maxsize)
+            self._entries: List[Tuple[int, List[Document]]] = []  # (top_k, documents)
+    
+    def get(self, query_vector: np.ndarray, top_k: int) -> Optional[List[Document]]:
+        """Return cached documents for a similar query, or None on a miss."""
+        with self._lock:
+            count = len(self._entries)
+            if not count:
+                return None
+            
+            now = time.time()
+            # Embeddings are L2-normalized, so the inner product is cosine similarity
+            similarities = self._vectors[:count] @ query_vector
+            similarities[now - self._created[:count] > self.ttl] = -np.inf
+            
+            best = int(np.argmax(similarities))
+            cached_top_k, documents = self._entries[best]
+            if similarities[best] < self.threshold or cached_top_k != top_k:
+                return None
+            
+            self._last_used[best] = now
+            return list(documents)
+    
+    def put(self, query_vector: np.ndarray, top_k: int, documents: List[Document]) -> None:
+        """Cache documents for a query, evicting the least recently used entry when full."""
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.maxsize, query_vector.shape[0]), dtype=np.float32)
+            
+            # Copy so the caller's later changes to its list don't reach the cache
+            entry = (top_k, list(documents))
+            if len(self._entries) < self.maxsize:
+                slot = len(self._entries)
+                self._entries.append(entry)
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._entries[slot] = entry
+            
+            now = time.time()
+            self._vectors[slot] = query_vector
+            self._created[slot] = now
+            self._last_used[slot] = now
 
 class HybridRetriever:
     """
@@ -93,8 +181,24 @@ class HybridRetriever:
         self.hf_model = huggingface_model
         self.pinecone_env = pinecone_env
         self.semantic = None
+        self._semantic_lock = threading.Lock()
+        self._next_retry_ts = 0.0
+        self._retry_delay = SEMANTIC_RETRY_INITIAL
         self.bm25 = None
-        self.bm25_docs = []
+        # Corpus stored column-wise, indexed by BM25 document id
+        self.doc_texts: List[str] = []
+        self.doc_ids: List[Optional[str]] = []
+        self.doc_dois: List[Optional[str]] = []
+        self.doc_urls: List[Optional[str]] = []
+        self.doc_titles: List[Optional[str]] = []
+        self.doc_categories: List[Optional[str]] = []
+        self.doc_species: List[Optional[str]] = []
+        self.sparse_encoder = SparseEncoder.load() if HYBRID_SEARCH else None
+        self.local_vectors = QuantizedVectorStore.load()  # Quantized replica written at ingest
+        self._feedback_scores = None  # Last dict returned by load_scores()
+        self.response_cache = SemanticResponseCache()
+        self._executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS,
+                                            thread_name_prefix="bm25")
         
         # Initialize components
         self._initialize_embeddings()
@@ -102,29 +206,46 @@ class HybridRetriever:
         self._initialize_semantic()
     
     def _initialize_embeddings(self) -> None:
-        """Initialize HuggingFace embeddings."""
+        """Initialize HuggingFace embeddings (INT8 ONNX when available)."""
         try:
-            self.embed = HuggingFaceEmbeddings(
-                model_name=self.hf_model,
-                model_kwargs={'device': 'cpu'},  # Ensure CPU usage for Render
-                encode_kwargs={'normalize_embeddings': True}
-            )
+            self.embed = load_embeddings(self.hf_model)
             logger.info(f"Initialized embeddings with model: {self.hf_model}")
         except Exception as e:
             logger.error(f"Failed to initialize embeddings: {e}")
             raise
     
+    def _metadata_columns(self) -> Tuple[Tuple[str, List[Optional[str]]], ...]:
+        """Pair each corpus metadata field with its column."""
+        return tuple(zip(CORPUS_METADATA_FIELDS, (
+            self.doc_ids, self.doc_dois, self.doc_urls,
+            self.doc_titles, self.doc_categories, self.doc_species
+        )))
+    
+    def _load_corpus(self) -> None:
+        """Load the corpus into parallel per-field lists; absent fields are None."""
+        for doc in iter_corpus():
+            self.doc_texts.append(doc["text"])
+            for field, column in self._metadata_columns():
+                column.append(doc.get(field))
+    
     def _initialize_bm25(self) -> None:
         """Initialize BM25 lexical retriever."""
         try:
-            texts, docs = load_corpus_texts()
-            self.bm25_docs = docs
+            self._load_corpus()
+            texts = self.doc_texts
             
             if texts:
-                # Tokenize texts for BM25
-                tokenized_corpus = [text.lower().split() for text in texts]
-                self.bm25 = BM25Okapi(tokenized_corpus)
-                logger.info(f"Initialized BM25 with {len(texts)} documents")
+                # Reuse the persisted index if it was built from the same corpus
+                fingerprint = corpus_fingerprint(texts)
+                self.bm25 = BM25Index.load(BM25_INDEX_DIR, fingerprint)
+                
+                if self.bm25 is not None:
+                    logger.info(f"Loaded BM25 index with {len(texts)} documents from {BM25_INDEX_DIR}")
+                else:
+                    # Stream token lists into the index; they are never all held at once
+                    self.bm25 = BM25Index.build(tokenize(text) for text in texts)
+                    self.bm25.save(BM25_INDEX_DIR, fingerprint)
+                    logger.info(f"Initialized BM25 with {len(texts)} documents")
             else:
                 logger.warning("No texts found - BM25 retrieval disabled")
                 self.bm25 = None
@@ -140,51 +261,64 @@ class HybridRetriever:
             existing_indexes = pinecone.list_indexes()
             if self.pinecone_index_name not in existing_indexes:
                 logger.warning(f"Pinecone index '{self.pinecone_index_name}' not found")
+                self._schedule_semantic_retry()
                 return
                 
-            self.semantic = Pinecone.from_existing_index(
-                self.pinecone_index_name, 
-                embedding=self.embed
-            ).as_retriever(
-                search_type="similarity",
-                search_kwargs={"k": 8}  # Get more candidates for better ranking
-            )
+            # Prefer the gRPC client (HTTP/2 + protobuf) when pinecone-client[grpc] is installed
+            index_class = getattr(pinecone, "GRPCIndex", None)
+            if index_class is None:
+                logger.warning("Pinecone gRPC client not installed, falling back to REST")
+                index_class = pinecone.Index
+            
+            self.semantic = index_class(self.pinecone_index_name)
+            self._retry_delay = SEMANTIC_RETRY_INITIAL
             logger.info(f"Initialized semantic retriever with index: {self.pinecone_index_name}")
             
         except Exception as e:
             logger.warning(f"Semantic retriever not available: {e}")
-            self.semantic = None
+            self._schedule_semantic_retry()
+    
+    def _schedule_semantic_retry(self, delay: Optional[float] = None) -> None:
+        """Disable semantic search until the next reconnect attempt."""
+        self.semantic = None
+        if delay is None:
+            # Exponential backoff between failed initialization attempts
+            delay = self._retry_delay
+            self._retry_delay = min(self._retry_delay * 2, SEMANTIC_RETRY_MAX)
+        self._next_retry_ts = time.time() + delay
+        logger.info(f"Semantic retriever reconnect scheduled in {delay:.0f}s")
+    
+    def _ensure_semantic(self):
+        """Return the Pinecone index, reconnecting if a retry is due."""
+        if self.semantic is None and time.time() >= self._next_retry_ts:
+            with self._semantic_lock:
+                # Only one thread reconnects; the others see the result
+                if self.semantic is None and time.time() >= self._next_retry_ts:
+                    self._initialize_semantic()
+        return self.semantic
     
-    def _get_bm25_results(self, query: str, top_k: int = 6) -> List[Document]:
-        """Get results from BM25 lexical search."""
+    def _get_bm25_results(self, query_tokens: List[str], top_k: int = 6) -> List[Document]:
+        """Get results from BM25 lexical search for an already tokenized query."""
         results = []
         
-        if not self.bm25 or not self.bm25_docs:
+        if not self.bm25 or not self.doc_texts:
             return results
         
         try:
-            # Tokenize query
-            tokenized_query = query.lower().split()
-            
-            # Get BM25 scores for all documents
-            scores = self.bm25.get_scores(tokenized_query)
+            # Score only documents sharing a term with the query
+            top_indices, scores = self.bm25.search(query_tokens, top_k)
+            columns = self._metadata_columns()
             
-            # Get top scoring documents
-            top_indices = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)[:top_k]
-            
-            for idx in top_indices:
-                if idx < len(self.bm25_docs):
-                    doc_data = self.bm25_docs[idx]
-                    
+            for idx, score in zip(top_indices.tolist(), scores.tolist()):
+                if idx < len(self.doc_texts):
                     # Create Document with BM25 score
-                    doc = Document(
-                        page_content=doc_data.get("text", ""),
-                        metadata={
-                            **doc_data,
-                            "retrieval_method": "bm25",
-                            "bm25_score": float(scores[idx])
-                        }
-                    )
+                    metadata = {
+                        field: column[idx] for field, column in columns
+                        if column[idx] is not None
+                    }
+                    metadata["retrieval_method"] = "bm25"
+                    metadata["bm25_score"] = score
+                    doc = Document(page_content=self.doc_texts[idx], metadata=metadata)
                     results.append(doc)
             
             logger.debug(f"BM25 retrieved {len(results)} documents")
@@ -194,72 +328,174 @@ class HybridRetriever:
         
         return results
     
-    def _get_semantic_results(self, query: str, top_k: int = 8) -> List[Document]:
-        """Get results from semantic search."""
+    def _get_semantic_results(self, query_vector: Optional[np.ndarray],
+                              query_tokens: List[str], top_k: int = 8) -> List[Document]:
+        """Get results from semantic (or sparse-dense hybrid) search for an embedded query."""
         results = []
         
-        if not self.semantic:
+        if query_vector is None:
             return results
         
+        semantic = self._ensure_semantic()
+        if not semantic:
+            return self._get_local_semantic_results(query_vector, top_k)
+        
         try:
-            sem_docs = self.semantic.get_relevant_documents(query)
+            query_kwargs = {"vector": query_vector.tolist()}
+            retrieval_method = "semantic"
+            
+            if self.sparse_encoder is not None:
+                sparse_vector = self.sparse_encoder.encode_query(query_tokens)
+                if sparse_vector["indices"]:
+                    # Convex combination: dense weighted by alpha, sparse by 1 - alpha
+                    query_kwargs = {
+                        "vector": (query_vector * SEMANTIC_WEIGHT).tolist(),
+                        "sparse_vector": {
+                            "indices": sparse_vector["indices"],
+                            "values": [v * BM25_WEIGHT for v in sparse_vector["values"]]
+                        }
+                    }
+                    retrieval_method = "hybrid"
+            
+            response = semantic.query(
+                top_k=min(top_k, SEMANTIC_CANDIDATES),
+                include_metadata=True,
+                **query_kwargs
+            )
             
-            # Add retrieval method metadata
-            for doc in sem_docs[:top_k]:
-                doc.metadata["retrieval_method"] = "semantic"
-                results.append(doc)
+            for match in response.matches:
+                metadata = dict(match.metadata or {})
+                if TEXT_KEY not in metadata:
+                    logger.warning(f"Skipping Pinecone match {match.id} without '{TEXT_KEY}' metadata")
+                    continue
+                
+                # Add retrieval method and Pinecone similarity for ranking
+                metadata["retrieval_method"] = retrieval_method
+                metadata["semantic_score"] = float(match.score)
+                results.append(Document(page_content=metadata.pop(TEXT_KEY), metadata=metadata))
             
             logger.debug(f"Semantic search retrieved {len(results)} documents")
             
         except Exception as e:
             logger.error(f"Error in semantic retrieval: {e}")
+            # Rebuild the client later instead of failing every query on a bad connection
+            self._schedule_semantic_retry(SEMANTIC_RETRY_AFTER_ERROR)
         
         return results
     
-    def _deduplicate_and_rank(self, documents: List[Document], top_k: int) -> List[Document]:
-        """Remove duplicates and rank documents using feedback scores."""
+    def _get_local_semantic_results(self, query_vector: np.ndarray, top_k: int) -> List[Document]:
+        """Search the local quantized vector replica while Pinecone is unavailable."""
+        results = []
+        
+        if self.local_vectors is None:
+            return results
+        
+        try:
+            top_indices, scores = self.local_vectors.search(query_vector, min(top_k, SEMANTIC_CANDIDATES))
+            
+            for idx, score in zip(top_indices.tolist(), scores.tolist()):
+                metadata = dict(self.local_vectors.records[idx])
+                metadata["retrieval_method"] = "semantic"
+                metadata["semantic_score"] = score
+                results.append(Document(page_content=metadata.pop(TEXT_KEY, ""), metadata=metadata))
+            
+            logger.debug(f"Local quantized search retrieved {len(results)} documents")
+            
+        except Exception as e:
+            logger.error(f"Error in local quantized retrieval: {e}")
+        
+        return results
+    
+    def _scores(self) -> Dict[str, float]:
+        """
+        Return feedback scores. load_scores() only re-parses changed files and
+        returns the same dict until they change, so identity detects updates.
+        """
         scores = load_scores()
-        seen = set()
+        
+        if scores is not self._feedback_scores:
+            self._feedback_scores = scores
+            # Cached rankings were computed with the old feedback scores
+            self.response_cache.clear()
+        
+        return scores
+    
+    def _deduplicate_and_rank(self, documents: List[Document], top_k: int,
+                              scores: Dict[str, float]) -> List[Document]:
+        """
+        Remove duplicates and rank documents using the request's feedback scores.
+        A document found by several methods keeps the best score from each.
+        """
+        use_feedback = bool(scores)  # Nothing to look up before any feedback is recorded
+        seen: Dict[Any, int] = {}  # str id or int content hash -> position in unique_docs
         unique_docs = []
+        bm25_scores, semantic_scores, feedback_scores = [], [], []
         
         for doc in documents:
+            metadata = doc.metadata
+            
             # Generate unique key for deduplication
             doc_key = (
-                doc.metadata.get("doi") or 
-                doc.metadata.get("url") or 
-                doc.metadata.get("id") or 
-                doc.page_content[:100]  # First 100 chars as fallback
+                metadata.get("doi") or 
+                metadata.get("url") or 
+                metadata.get("id") or 
+                xxhash.xxh3_64_intdigest(doc.page_content.encode("utf-8"))  # 64-bit content hash as fallback
             )
             
-            if doc_key in seen:
+            bm25_score = metadata.get("bm25_score", 0.0)
+            semantic_score = metadata.get("semantic_score", 0.0)
+            
+            position = seen.get(doc_key)
+            if position is not None:
+                # Merge into the first copy so agreement between methods is not lost
+                kept = unique_docs[position].metadata
+                if kept.get("retrieval_method") != metadata.get("retrieval_method"):
+                    kept["retrieval_method"] = "hybrid"
+                if bm25_score > bm25_scores[position]:
+                    bm25_scores[position] = kept["bm25_score"] = bm25_score
+                if semantic_score > semantic_scores[position]:
+                    semantic_scores[position] = kept["semantic_score"] = semantic_score
                 continue
             
-            seen.add(doc_key)
+            seen[doc_key] = len(unique_docs)
             
             # Add feedback score boost
-            feedback_score = scores.get(doc_key, 0)
-            doc.metadata["feedback_score"] = feedback_score
-            
-            # Calculate composite score
-            bm25_score = doc.metadata.get("bm25_score", 0)
-            semantic_relevance = 1.0  # Default for semantic results
-            
-            # Combine scores with weights
-            composite_score = (
-                (bm25_score * BM25_WEIGHT) +
-                (semantic_relevance * SEMANTIC_WEIGHT) +
-                (feedback_score * 0.1)  # Small boost from user feedback
-            )
+            if use_feedback:
+                feedback_score = scores.get(doc_key, 0)
+                metadata["feedback_score"] = feedback_score
+                feedback_scores.append(feedback_score)
             
-            doc.metadata["composite_score"] = composite_score
+            bm25_scores.append(bm25_score)
+            semantic_scores.append(semantic_score)
             unique_docs.append(doc)
         
+        # Combine scores with weights (small boost from user feedback)
+        composite = (
+            BM25_WEIGHT * np.array(bm25_scores, dtype=np.float32) +
+            SEMANTIC_WEIGHT * np.array(semantic_scores, dtype=np.float32)
+        )
+        if use_feedback:
+            composite += FEEDBACK_WEIGHT * np.array(feedback_scores, dtype=np.float32)
+        
         # Sort by composite score
-        unique_docs.sort(key=lambda x: x.metadata.get("composite_score", 0), reverse=True)
+        order = np.argsort(-composite, kind="stable")[:top_k]
+        ranked_docs = []
+        for idx in order.tolist():
+            doc = unique_docs[idx]
+            doc.metadata["composite_score"] = float(composite[idx])
+            ranked_docs.append(doc)
         
         logger.info(f"Ranked {len(unique_docs)} unique documents from {len(documents)} total")
         
-        return unique_docs[:top_k]
+        return ranked_docs
+    
+    def _embed_query_vector(self, query: str) -> Optional[np.ndarray]:
+        """Embed a query once per request, or None if embedding fails."""
+        try:
+            return np.asarray(self.embed.embed_query(query), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"Could not embed query: {e}")
+            return None
     
     def get_relevant_documents(self, query: str, top_k: int = 6) -> List[Document]:
         """
@@ -277,22 +513,51 @@ class HybridRetriever:
             return []
         
         try:
+            # Fetch feedback scores once per request; a change drops stale cached rankings
+            scores = self._scores()
+            
+            # Tokenize and embed once; every retrieval step reuses these
+            query_tokens = tokenize(query)
+            query_vector = self._embed_query_vector(query)
+            
+            # Serve repeated or paraphrased questions from the response cache
+            if query_vector is not None:
+                cached_results = self.response_cache.get(query_vector, top_k)
+                if cached_results is not None:
+                    logger.info(f"Response cache hit for query: '{query[:50]}...'")
+                    return cached_results
+            
             all_results = []
             
-            # Get BM25 results
-            bm25_results = self._get_bm25_results(query, top_k)
-            all_results.extend(bm25_results)
+            # In hybrid mode Pinecone also scores lexical matches; local BM25 is a fallback
+            use_local_bm25 = self.sparse_encoder is None
+            
+            # Score BM25 on the pool while this thread makes the network-bound Pinecone
+            # call, so concurrent requests never wait on each other's lookups
+            bm25_future = None
+            if use_local_bm25:
+                bm25_future = self._executor.submit(self._get_bm25_results, query_tokens, top_k)
             
             # Get semantic results
-            semantic_results = self._get_semantic_results(query, top_k)
+            semantic_results = self._get_semantic_results(query_vector, query_tokens, top_k)
+            
+            # Get BM25 results
+            if bm25_future is not None:
+                all_results.extend(bm25_future.result())
             all_results.extend(semantic_results)
             
+            if not use_local_bm25 and not semantic_results:
+                all_results.extend(self._get_bm25_results(query_tokens, top_k))
+            
             # If no results from either method, return default documents
             if not all_results:
                 return self._get_default_documents()
             
             # Deduplicate and rank
-            final_results = self._deduplicate_and_rank(all_results, top_k)
+            final_results = self._deduplicate_and_rank(all_results, top_k, scores)
+            
+            if query_vector is not None:
+                self.response_cache.put(query_vector, top_k, final_results)
             
             logger.info(f"Retrieved {len(final_results)} documents for query: '{query[:50]}...'")
             
@@ -321,18 +586,19 @@ class HybridRetriever:
         return {
             "embeddings_available": self.embed is not None,
             "bm25_available": self.bm25 is not None,
-            "bm25_docs_count": len(self.bm25_docs),
+            "bm25_docs_count": len(self.doc_texts),
             "semantic_available": self.semantic is not None,
+            "local_vectors_count": len(self.local_vectors) if self.local_vectors is not None else 0,
             "pinecone_index": self.pinecone_index_name,
             "embedding_model": self.hf_model
         }
     
     def get_retrieval_stats(self) -> Dict[str, Any]:
         """Get retrieval statistics."""
-        feedback_scores = load_scores()
+        feedback_scores = self._scores()
         
         return {
-            "total_corpus_docs": len(self.bm25_docs),
+            "total_corpus_docs": len(self.doc_texts),
             "feedback_scores_count": len(feedback_scores),
             "average_feedback_score": (
                 sum(feedback_scores.values()) / len(feedback_scores) 
@@ -15,12 +15,14 @@ from langchain.chains import RetrievalQA
 from langchain.prompts import PromptTemplate
 import pinecone
 
+# Load environment variables before our modules read their settings
+load_dotenv()
+
 # Import our custom modules
 from feedback_utils import update_scores, log_feedback, get_score_stats
 from hybrid_retriever import HybridRetriever
-
-# Load environment variables
-load_dotenv()
+from bm25_index import SparseEncoder
+from vector_quantization import QuantizedVectorStore
 
 # Environment variables
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
@@ -287,6 +289,15 @@ def initialize_knowledge_base():
         success = upserter.upsert_documents(documents)
         
         if success:
+            # Pick up the BM25 statistics written for hybrid queries
+            if retriever and retriever.sparse_encoder is not None:
+                retriever.sparse_encoder = SparseEncoder.load()
+            # And the quantized vector replica used while Pinecone is unreachable
+            if retriever:
+                retriever.local_vectors = QuantizedVectorStore.load()
+                # Cached responses predate the new documents
+                retriever.response_cache.clear()
+            
             return {
                 "status": "success", 
                 "message": f"Knowledge base initialized with {len(documents)} documents",
@@ -309,5 +320,9 @@ if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))
     print(f"🚀 Starting VetIOS API server on port {port}")
     print(f"🔍 Services initialized: {services_initialized}")
-    uvicorn.run(app, host="0.0.0.0", port=port)
+    # Single process: the embedding model is loaded once at import, and
+    # uvicorn workers are spawned (not forked), so each extra worker would
+    # load its own copy. Request concurrency comes from FastAPI's thread
+    # pool and the retriever's semantic worker threads instead.
+    uvicorn.run(app, host="0.0.0.0", port=port, workers=1, reload=False)
   
@@ -0,0 +1,27 @@
+import os
+
+import numpy as np
+
+# Settings shared by ingest and retrieval; read after the entry point loads .env
+# Let Pinecone score dense and BM25 sparse vectors in one query (needs a dotproduct index)
+HYBRID_SEARCH = os.getenv("PINECONE_HYBRID", "false").lower() == "true"
+TEXT_KEY = "text"  # Metadata field holding the chunk text (LangChain convention)
+
+def top_k_indices(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Indices of the k highest scores, best first.
+    Selects in O(n), then sorts only those k; ties go to the lower index.
+    """
+    k = min(k, scores.size)
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < scores.size:
+        # argpartition picks arbitrary entries among ties at the cutoff, so take
+        # everything above the k-th largest score and fill up with the first ties
+        cutoff = np.partition(scores, scores.size - k)[scores.size - k]
+        above = np.flatnonzero(scores > cutoff)
+        ties = np.flatnonzero(scores == cutoff)[:k - above.size]
+        top = np.concatenate([above, ties])
+    else:
+        top = np.arange(scores.size)
+    return top[np.argsort(-scores[top], kind="stable")]
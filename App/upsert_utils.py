@@ -1,36 +1,59 @@
 import os
 import json
+import time
+import uuid
 import logging
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_community.vectorstores import Pinecone
 from langchain.schema import Document
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 import pinecone
 
+# Load environment variables before local modules read their settings
+load_dotenv()
+
+from embedding_models import load_embeddings
+from bm25_index import SparseEncoder, tokenize
+from vector_quantization import QuantizedVectorStore, PRECISIONS
+from search_utils import HYBRID_SEARCH, TEXT_KEY
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Load environment variables
-load_dotenv()
-
 # Environment variables
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_ENV = os.getenv("PINECONE_ENV", "gcp-starter")
 INDEX_NAME = os.getenv("PINECONE_INDEX", "vetios-index")
 CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
 CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+CHUNK_PATTERNS = [b"\n\n", b"\n", b". ", b"! ", b"? "]  # chonkie-core cut points, as in the LangChain splitter
+EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+UPSERT_POOL_THREADS = 30  # Concurrent upsert requests; ingest is network-bound
+DOCUMENT_CHUNK_SIZE = 1000  # Documents embedded and upserted per round
+UPSERT_BATCH_SIZE = 64  # Vectors per upsert request
+INDEX_READY_TIMEOUT = 60  # Seconds to wait for a new index to become ready
+INDEX_READY_POLL_MAX = 5  # Cap for the readiness polling interval
+VECTOR_QUANTIZATION = os.getenv("VECTOR_QUANTIZATION", "int8")  # Local replica: "fp32" (none), "int8" or "binary"
 
 class VeterinaryDocumentUpserter:
     """Enhanced document upserter for VetIOS knowledge base."""
     
-    def __init__(self, index_name: str = INDEX_NAME):
+    def __init__(self, index_name: str = INDEX_NAME,
+                 pool_threads: int = UPSERT_POOL_THREADS,
+                 document_chunk_size: int = DOCUMENT_CHUNK_SIZE,
+                 quantization: str = VECTOR_QUANTIZATION):
+        if quantization != "fp32" and quantization not in PRECISIONS:
+            raise ValueError(f"Unsupported quantization '{quantization}', expected fp32, int8 or binary")
+        
         self.index_name = index_name
+        self.quantization = quantization
+        self.pool_threads = pool_threads
+        self.document_chunk_size = document_chunk_size
         self.embeddings = None
-        self.vectorstore = None
+        self.index = None
         self.text_splitter = None
+        self.chunk_offsets = None  # chonkie-core's SIMD chunker, when installed
         self._initialize_components()
     
     def _initialize_components(self):
@@ -40,12 +63,12 @@ class VeterinaryDocumentUpserter:
             pinecone.init(api_key=PINECONE_API_KEY, environment=PINECONE_ENV)
             logger.info("✅ Pinecone initialized successfully")
             
-            # Create embeddings model
-            self.embeddings = HuggingFaceEmbeddings(
-                model_name="sentence-transformers/all-MiniLM-L6-v2",
-                model_kwargs={'device': 'cpu'},
-                encode_kwargs={'normalize_embeddings': True}
-            )
+            # One client reused for every upsert; its thread pool runs async requests
+            self.index = pinecone.Index(self.index_name, pool_threads=self.pool_threads)
+            
+            # Same backend as the retriever (INT8 ONNX when available) so query
+            # and document vectors match; unchanged chunks are cached on disk
+            self.embeddings = load_embeddings(EMBEDDING_MODEL)
             logger.info("✅ Embeddings model loaded")
             
             # Initialize text splitter
@@ -57,6 +80,14 @@ class VeterinaryDocumentUpserter:
             )
             logger.info(f"✅ Text splitter initialized (chunk_size={CHUNK_SIZE}, overlap={CHUNK_OVERLAP})")
             
+            # SIMD boundary search for long texts; the splitter above stays the fallback
+            try:
+                from chonkie_core import chunk_offsets
+                self.chunk_offsets = chunk_offsets
+                logger.info("✅ chonkie-core chunker enabled for long texts")
+            except ImportError:
+                logger.info("chonkie-core not installed, using the LangChain text splitter for long texts")
+            
         except Exception as e:
             logger.error(f"❌ Failed to initialize components: {e}")
             raise
@@ -71,14 +102,13 @@ class VeterinaryDocumentUpserter:
                 pinecone.create_index(
                     name=self.index_name,
                     dimension=dimension,  # all-MiniLM-L6-v2 produces 384-dim embeddings
-                    metric="cosine",
+                    metric="dotproduct" if HYBRID_SEARCH else "cosine",  # Sparse values need dotproduct
                     metadata_config={"indexed": ["source", "category", "species", "urgency"]}
                 )
                 logger.info(f"✅ Created index '{self.index_name}'")
                 
                 # Wait for index to be ready
-                import time
-                time.sleep(10)
+                self._wait_for_index_ready()
             else:
                 logger.info(f"✅ Index '{self.index_name}' already exists")
                 
@@ -86,6 +116,25 @@ class VeterinaryDocumentUpserter:
             logger.error(f"❌ Error creating index: {e}")
             raise
     
+    def _wait_for_index_ready(self, timeout: float = INDEX_READY_TIMEOUT) -> bool:
+        """
+        Poll the index status with exponential backoff until it is ready.
+        Returns True once ready, False if the timeout expires first.
+        """
+        deadline = time.monotonic() + timeout
+        delay = 1.0
+        
+        while not pinecone.describe_index(self.index_name).status.get("ready"):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"⚠️ Index '{self.index_name}' not ready after {timeout:.0f}s, continuing")
+                return False
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 1.5, INDEX_READY_POLL_MAX)
+        
+        logger.info(f"✅ Index '{self.index_name}' is ready")
+        return True
+    
     def prepare_veterinary_documents(self) -> List[Document]:
         """Prepare comprehensive veterinary documents."""
         sample_docs = [
@@ -158,67 +207,157 @@ class VeterinaryDocumentUpserter:
         documents = []
         for doc_data in sample_docs:
             # Split long documents into chunks
-            text_chunks = self.text_splitter.split_text(doc_data["text"])
+            text_chunks = self._split_text(doc_data["text"])
+            
+            # Fields shared by every chunk of this document
+            base_metadata = {
+                "title": doc_data["title"],
+                "category": doc_data["category"],
+                "species": doc_data["species"],
+                "source": doc_data["source"],
+                "urgency": doc_data.get("urgency", "moderate"),
+                "total_chunks": len(text_chunks)
+            }
+            slug = doc_data["title"].lower().replace(" ", "_")
             
             for i, chunk in enumerate(text_chunks):
-                metadata = {
-                    "title": doc_data["title"],
-                    "category": doc_data["category"],
-                    "species": doc_data["species"],
-                    "source": doc_data["source"],
-                    "urgency": doc_data.get("urgency", "moderate"),
-                    "chunk_index": i,
-                    "total_chunks": len(text_chunks),
-                    "doc_id": f"{doc_data['title'].lower().replace(' ', '_')}_{i}"
-                }
-                
+                metadata = {**base_metadata, "chunk_index": i, "doc_id": f"{slug}_{i}"}
                 documents.append(Document(page_content=chunk, metadata=metadata))
         
         logger.info(f"✅ Prepared {len(documents)} document chunks from {len(sample_docs)} source documents")
         return documents
     
-    def upsert_documents(self, documents: List[Document], batch_size: int = 50) -> bool:
-        """Upsert documents to Pinecone in batches."""
+    def _split_text(self, text: str) -> List[str]:
+        """
+        Split text into chunks of at most CHUNK_SIZE characters.
+        
+        Texts that fit in one chunk skip splitting. Longer texts are cut by
+        chonkie-core when it is installed, otherwise by the LangChain splitter.
+        """
+        if len(text) <= CHUNK_SIZE:
+            # Same result as the splitter, without scanning for separators
+            stripped = text.strip()
+            return [stripped] if stripped else []
+        
+        if self.chunk_offsets is not None:
+            try:
+                return self._fast_split_text(text)
+            except Exception as e:
+                logger.warning(f"chonkie-core chunking failed, using the LangChain text splitter: {e}")
+        
+        return self.text_splitter.split_text(text)
+    
+    def _fast_split_text(self, text: str) -> List[str]:
+        """
+        Cut UTF-8 text at CHUNK_PATTERNS with chonkie-core's SIMD search into
+        pieces of at most CHUNK_SIZE - CHUNK_OVERLAP bytes, then extend every
+        piece after the first back over up to CHUNK_OVERLAP bytes, starting at
+        a word. Chunks therefore stay within CHUNK_SIZE characters and share
+        up to CHUNK_OVERLAP with their neighbour, like the LangChain splitter.
+        """
+        data = text.encode("utf-8")
+        budget = CHUNK_SIZE - CHUNK_OVERLAP
+        chunks = []
+        start = 0
+        
+        while start < len(data):
+            # One byte past the budget makes chonkie-core search back for the last pattern
+            window = data[start:start + budget + 1]
+            end = start + self.chunk_offsets(window, size=budget, patterns=CHUNK_PATTERNS)[0][1]
+            
+            if end == start + budget and end < len(data):
+                # No pattern in range, so this is a hard cut: back off to the last
+                # space, or at least to the first byte of a multi-byte character
+                space = data.rfind(b" ", start, end)
+                if space > start:
+                    end = space + 1
+                else:
+                    while end > start and data[end] & 0xC0 == 0x80:
+                        end -= 1
+                if end == start:
+                    raise ValueError(f"Chunk budget of {budget} bytes is smaller than a character")
+            
+            chunk_start = start
+            if start:
+                window_start = start - CHUNK_OVERLAP
+                space = data.find(b" ", window_start, start) if window_start > 0 else -1
+                chunk_start = 0 if window_start <= 0 else (space + 1 if space != -1 else start)
+            
+            chunk = data[chunk_start:end].decode("utf-8").strip()
+            if chunk:
+                chunks.append(chunk)
+            start = end
+        
+        return chunks
+    
+    def upsert_documents(self, documents: List[Document], batch_size: int = UPSERT_BATCH_SIZE) -> bool:
+        """
+        Upsert documents to Pinecone.
+        
+        All documents are embedded in one call so the model always sees full
+        batches; vectors are then upserted document_chunk_size at a time, each
+        chunk as concurrent requests of batch_size vectors.
+        """
         try:
             # Create index if needed
             self.create_index_if_not_exists()
             
-            # Process documents in batches
-            total_batches = (len(documents) + batch_size - 1) // batch_size
+            # Extract texts, metadatas and ids in a single pass
+            texts, metadatas, ids = [], [], []
+            for doc in documents:
+                texts.append(doc.page_content)
+                metadatas.append(doc.metadata)
+                ids.append(doc.metadata.get("doc_id") or str(uuid.uuid4()))
             
-            for batch_num in range(0, len(documents), batch_size):
-                batch_docs = documents[batch_num:batch_num + batch_size]
-                current_batch = (batch_num // batch_size) + 1
+            sparse_encoder = None
+            if HYBRID_SEARCH:
+                # Merge this ingest into the corpus BM25 statistics so queries can apply IDF;
+                # saved only once the upsert has succeeded
+                sparse_encoder = SparseEncoder.load().update(ids, (tokenize(text) for text in texts))
+            
+            # Embed everything up front; the embedder batches internally
+            embeddings = self.embeddings.embed_documents(texts)
+            logger.info(f"Embedded {len(texts)} documents")
+            
+            # Process documents in chunks
+            total_chunks = (len(documents) + self.document_chunk_size - 1) // self.document_chunk_size
+            log_progress = logger.isEnabledFor(logging.INFO)  # Skip formatting progress lines otherwise
+            
+            for chunk_start in range(0, len(documents), self.document_chunk_size):
+                chunk = slice(chunk_start, chunk_start + self.document_chunk_size)
+                current_chunk = (chunk_start // self.document_chunk_size) + 1
                 
-                logger.info(f"Processing batch {current_batch}/{total_batches} ({len(batch_docs)} documents)")
+                if log_progress:
+                    logger.info(f"Processing chunk {current_chunk}/{total_chunks} ({len(texts[chunk])} documents)")
                 
                 try:
-                    # Extract texts and metadatas
-                    texts = [doc.page_content for doc in batch_docs]
-                    metadatas = [doc.metadata for doc in batch_docs]
+                    vectors = self._build_vectors(
+                        ids[chunk], texts[chunk], metadatas[chunk], embeddings[chunk], sparse_encoder
+                    )
                     
-                    # Upsert to Pinecone
-                    if not self.vectorstore:
-                        # Create new vectorstore
-                        self.vectorstore = Pinecone.from_texts(
-                            texts=texts,
-                            embedding=self.embeddings,
-                            metadatas=metadatas,
-                            index_name=self.index_name
-                        )
-                    else:
-                        # Add to existing vectorstore
-                        self.vectorstore.add_texts(
-                            texts=texts,
-                            metadatas=metadatas
-                        )
+                    # Send all batches at once on the index thread pool, then wait for them
+                    async_results = [
+                        self.index.upsert(vectors=vectors[i:i + batch_size], async_req=True)
+                        for i in range(0, len(vectors), batch_size)
+                    ]
+                    for async_result in async_results:
+                        async_result.get()
                     
-                    logger.info(f"✅ Batch {current_batch} upserted successfully")
+                    if log_progress:
+                        logger.info(f"✅ Chunk {current_chunk} upserted successfully ({len(async_results)} requests)")
                     
                 except Exception as e:
-                    logger.error(f"❌ Error upserting batch {current_batch}: {e}")
+                    logger.error(f"❌ Error upserting chunk {current_chunk}: {e}")
                     return False
             
+            if sparse_encoder is not None and sparse_encoder.save():
+                logger.info(f"✅ Saved sparse statistics ({sparse_encoder.num_docs} documents)")
+            
+            # Keep a quantized copy (int8: 1 byte/dim, binary: 1 bit/dim) for local
+            # search when Pinecone is unreachable
+            if self.quantization != "fp32":
+                self._save_vector_replica(ids, texts, metadatas, embeddings)
+            
             logger.info(f"🎉 Successfully upserted {len(documents)} documents to index '{self.index_name}'")
             return True
             
@@ -226,11 +365,56 @@ class VeterinaryDocumentUpserter:
             logger.error(f"❌ Error in upsert process: {e}")
             return False
     
+    def _save_vector_replica(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]],
+                             embeddings: List[List[float]]) -> None:
+        """Merge this ingest into the local quantized replica, replacing vectors by id."""
+        records = [{**metadata, TEXT_KEY: text} for metadata, text in zip(metadatas, texts)]
+        
+        store = QuantizedVectorStore.load()
+        if store is not None and store.precision == self.quantization:
+            try:
+                # Exact FP32 vectors for recalibration, normally from the embedding cache
+                store = store.upsert(ids, records, embeddings, embed_texts=self.embeddings.embed_documents)
+            except ValueError as e:
+                logger.warning(f"Rebuilding vector replica from this ingest only: {e}")
+                store = None
+        elif store is not None:
+            logger.warning(f"Rebuilding {store.precision} vector replica as {self.quantization} from this ingest only")
+            store = None
+        
+        if store is None:
+            store = QuantizedVectorStore.build(ids, records, embeddings, precision=self.quantization)
+        
+        if store.save():
+            logger.info(f"✅ Saved {self.quantization} vector replica ({len(store)} vectors)")
+    
+    def _build_vectors(self, ids: List[str], texts: List[str], metadatas: List[Dict[str, Any]],
+                       embeddings: List[List[float]],
+                       sparse_encoder: Optional[SparseEncoder] = None) -> List[Dict[str, Any]]:
+        """Build Pinecone vectors, adding BM25 sparse values for hybrid search."""
+        vectors = []
+        
+        for vector_id, text, metadata, embedding in zip(ids, texts, metadatas, embeddings):
+            vector = {
+                "id": vector_id,
+                "values": embedding,
+                "metadata": {**metadata, TEXT_KEY: text}
+            }
+            
+            if sparse_encoder is not None:
+                # Pinecone rejects empty sparse vectors
+                sparse_values = sparse_encoder.encode_document(tokenize(text))
+                if sparse_values["indices"]:
+                    vector["sparse_values"] = sparse_values
+            
+            vectors.append(vector)
+        
+        return vectors
+    
     def get_index_stats(self) -> Dict[str, Any]:
         """Get statistics about the Pinecone index."""
         try:
-            index = pinecone.Index(self.index_name)
-            stats = index.describe_index_stats()
+            stats = self.index.describe_index_stats()
             
             return {
                 "index_name": self.index_name,
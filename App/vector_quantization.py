@@ -0,0 +1,282 @@
+import os
+import json
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from search_utils import TEXT_KEY, top_k_indices
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Local quantized replica of the ingested vectors (Pinecone v2 only stores FP32)
+QUANTIZED_VECTORS_DIR = os.path.join("/tmp", "quantized_vectors")
+
+# Configuration
+PRECISIONS = ("int8", "binary")
+SEARCH_BLOCK_ROWS = 8192  # Codes scored per block
+BINARY_RESCORE_MULTIPLIER = 4  # Hamming candidates per result rescored with the FP32 query
+
+_META_FILE = "meta.json"
+_RECORDS_FILE = "records.json"
+_ARRAY_FILES = {"int8": ("codes", "starts", "steps"), "binary": ("codes", "rescore_vectors")}
+
+# Set bits per byte value, for Hamming distance on packed codes
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint16)
+
+def calibrate_int8(embeddings: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute per-dimension int8 ranges from calibration embeddings.
+
+    Returns:
+        Tuple of (starts, steps) mapping each dimension's [min, max] onto 256 levels
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    starts = embeddings.min(axis=0)
+    steps = (embeddings.max(axis=0) - starts) / 255
+    # Constant dimensions would otherwise divide by zero
+    return starts, np.where(steps > 0, steps, 1.0).astype(np.float32)
+
+def quantize_int8(embeddings: np.ndarray, starts: np.ndarray, steps: np.ndarray) -> np.ndarray:
+    """Quantize FP32 embeddings to int8 codes using calibrated ranges."""
+    codes = np.rint((np.asarray(embeddings, dtype=np.float32) - starts) / steps) - 128
+    return np.clip(codes, -128, 127).astype(np.int8)
+
+def quantize_binary(embeddings: np.ndarray) -> np.ndarray:
+    """Quantize embeddings to sign bits, packed 8 dimensions per byte."""
+    return np.packbits(np.asarray(embeddings) > 0, axis=1)
+
+class QuantizedVectorStore:
+    """
+    Quantized copy of the vectors upserted to Pinecone, searched exhaustively
+    with an FP32 query.
+
+    With int8 precision, scoring is asymmetric: ``q · (starts + (codes + 128)
+    * steps)`` is folded into a single product of the codes with
+    ``q * steps`` plus a constant, so documents are only ever read at one byte
+    per dimension. With binary precision, sign bits are packed 8 dimensions
+    per byte; candidates are selected by Hamming distance to the query's
+    sign bits and rescored exactly against FP32 vectors that stay on disk
+    (memory-mapped), so only the candidates' rows are ever read.
+    """
+
+    def __init__(self, ids: List[str], records: List[Dict[str, Any]], codes: np.ndarray,
+                 starts: Optional[np.ndarray] = None, steps: Optional[np.ndarray] = None,
+                 precision: str = "int8", dimension: Optional[int] = None,
+                 rescore_vectors: Optional[np.ndarray] = None):
+        self.ids = ids
+        self.records = records
+        self.codes = codes
+        self.starts = starts
+        self.steps = steps
+        self.precision = precision
+        self.dimension = dimension or codes.shape[1]
+        self.rescore_vectors = rescore_vectors
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids: List[str], records: List[Dict[str, Any]], embeddings: List[List[float]],
+              precision: str = "int8",
+              calibration_embeddings: Optional[np.ndarray] = None) -> "QuantizedVectorStore":
+        """
+        Quantize embeddings for local search.
+
+        Args:
+            ids: Vector ids, matching the Pinecone upsert
+            records: Metadata per vector, including the chunk text
+            embeddings: FP32 embeddings
+            precision: "int8" or "binary"
+            calibration_embeddings: Embeddings to take int8 ranges from (defaults to embeddings)
+
+        Returns:
+            Store holding the quantized codes
+        """
+        if precision not in PRECISIONS:
+            raise ValueError(f"Unsupported precision '{precision}', expected one of {PRECISIONS}")
+
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if precision == "binary":
+            return cls(ids, records, quantize_binary(embeddings), precision=precision,
+                       dimension=embeddings.shape[1], rescore_vectors=embeddings)
+
+        starts, steps = calibrate_int8(
+            embeddings if calibration_embeddings is None else calibration_embeddings
+        )
+        return cls(ids, records, quantize_int8(embeddings, starts, steps), starts, steps)
+
+    def vectors(self) -> np.ndarray:
+        """
+        FP32 vectors behind the codes: exact for binary precision, dequantized
+        (within half a step per dimension) for int8.
+        """
+        if self.precision == "binary":
+            return np.asarray(self.rescore_vectors, dtype=np.float32)
+        return self.starts + (self.codes.astype(np.float32) + 128) * self.steps
+
+    def upsert(self, ids: List[str], records: List[Dict[str, Any]], embeddings: List[List[float]],
+               embed_texts: Optional[Callable[[List[str]], List[List[float]]]] = None) -> "QuantizedVectorStore":
+        """
+        Merge vectors into the store like a Pinecone upsert: ids already
+        present are replaced, all others are kept.
+
+        int8 codes of kept vectors are reused unchanged while the new vectors
+        fit the calibrated ranges, so repeated ingests add no rounding error.
+        Otherwise the ranges are recalibrated over the merged vectors.
+
+        Args:
+            ids: Vector ids, matching the Pinecone upsert
+            records: Metadata per vector, including the chunk text
+            embeddings: FP32 embeddings
+            embed_texts: Returns FP32 embeddings for kept chunk texts when int8
+                ranges must be recalibrated (kept codes are dequantized without it)
+
+        Returns:
+            New store holding the merged vectors
+        """
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if embeddings.ndim != 2 or embeddings.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dimensional embeddings, got shape {embeddings.shape}")
+
+        replaced = set(ids)
+        kept = [i for i, vector_id in enumerate(self.ids) if vector_id not in replaced]
+        merged_ids = [self.ids[i] for i in kept] + list(ids)
+        merged_records = [self.records[i] for i in kept] + list(records)
+
+        if self.precision == "binary":
+            # Sign bits are rebuilt from the exact FP32 rescoring vectors
+            return self.build(merged_ids, merged_records,
+                              np.concatenate([self.vectors()[kept], embeddings]), precision="binary")
+
+        starts, steps = np.array(self.starts), np.array(self.steps)
+        if np.all((embeddings >= starts) & (embeddings <= starts + 255 * steps)):
+            codes = np.concatenate([self.codes[kept], quantize_int8(embeddings, starts, steps)])
+            return type(self)(merged_ids, merged_records, codes, starts, steps)
+
+        kept_vectors = None
+        if embed_texts is not None and kept:
+            try:
+                kept_vectors = np.asarray(
+                    embed_texts([self.records[i].get(TEXT_KEY, "") for i in kept]), dtype=np.float32
+                )
+            except Exception as e:
+                logger.warning(f"Could not re-embed kept vectors, recalibrating from int8 codes: {e}")
+        if kept_vectors is None:
+            kept_vectors = self.vectors()[kept]
+
+        return self.build(merged_ids, merged_records,
+                          np.concatenate([kept_vectors, embeddings]), precision="int8")
+
+    def search(self, query_vector: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score every stored vector against an FP32 query.
+
+        Returns:
+            Tuple of (vector indices, approximate dot products), best first
+        """
+        if not len(self) or top_k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        if self.precision == "binary":
+            return self._search_binary(query_vector, top_k)
+
+        weights = query_vector * self.steps
+        offset = float(query_vector @ self.starts) + 128 * float(weights.sum())
+
+        # Upcast the codes block by block to bound the temporary FP32 copy
+        scores = np.empty(len(self), dtype=np.float32)
+        for start in range(0, len(self), SEARCH_BLOCK_ROWS):
+            block = self.codes[start:start + SEARCH_BLOCK_ROWS]
+            scores[start:start + len(block)] = block.astype(np.float32) @ weights
+        scores += offset
+
+        order = top_k_indices(scores, top_k)
+        return order.astype(np.int64), scores[order]
+
+    def _search_binary(self, query_vector: np.ndarray, top_k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Hamming-distance candidate search followed by exact FP32 rescoring."""
+        query_bits = quantize_binary(query_vector[None, :])[0]
+
+        distances = np.empty(len(self), dtype=np.int32)
+        for start in range(0, len(self), SEARCH_BLOCK_ROWS):
+            block = self.codes[start:start + SEARCH_BLOCK_ROWS]
+            distances[start:start + len(block)] = _POPCOUNT[block ^ query_bits].sum(axis=1)
+
+        candidates = top_k_indices(-distances, top_k * BINARY_RESCORE_MULTIPLIER)
+
+        # Sorted indices keep reads from the memory-mapped vectors sequential
+        candidates = np.sort(candidates)
+        scores = np.asarray(self.rescore_vectors[candidates], dtype=np.float32) @ query_vector
+
+        order = top_k_indices(scores, top_k)
+        return candidates[order].astype(np.int64), scores[order]
+
+    def save(self, directory: str = QUANTIZED_VECTORS_DIR) -> bool:
+        """
+        Persist the store as .npy arrays plus a records file.
+        Returns True if successful, False otherwise.
+        """
+        try:
+            os.makedirs(directory, exist_ok=True)
+            meta_path = os.path.join(directory, _META_FILE)
+
+            # Remove metadata first so a partial write is never considered valid
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+
+            # Replace rather than truncate: a loaded store may still map the old files
+            for name in _ARRAY_FILES[self.precision]:
+                path = os.path.join(directory, f"{name}.npy")
+                with open(path + ".tmp", "wb") as f:
+                    np.save(f, getattr(self, name))
+                os.replace(path + ".tmp", path)
+
+            with open(os.path.join(directory, _RECORDS_FILE), "wb") as f:
+                f.write(orjson.dumps({"ids": self.ids, "records": self.records}))
+
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({
+                    "count": len(self),
+                    "dimension": int(self.dimension),
+                    "precision": self.precision
+                }, f)
+
+            logger.debug(f"Saved {len(self)} quantized vectors to {directory}")
+            return True
+        except Exception as e:
+            logger.warning(f"Error saving quantized vectors: {e}")
+            return False
+
+    @classmethod
+    def load(cls, directory: str = QUANTIZED_VECTORS_DIR) -> Optional["QuantizedVectorStore"]:
+        """
+        Load a persisted store with memory-mapped codes.
+        Returns None if no complete store exists.
+        """
+        meta_path = os.path.join(directory, _META_FILE)
+        if not os.path.exists(meta_path):
+            return None
+
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            precision = meta.get("precision", "int8")
+
+            with open(os.path.join(directory, _RECORDS_FILE), "rb") as f:
+                data = orjson.loads(f.read())
+
+            arrays = {
+                name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+                for name in _ARRAY_FILES[precision]
+            }
+            return cls(data["ids"], data["records"], precision=precision,
+                       dimension=meta["dimension"], **arrays)
+
+        except Exception as e:
+            logger.warning(f"Error loading quantized vectors: {e}")
+            return None